@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
 import os
 import re
 import shutil
@@ -8,6 +12,7 @@ import subprocess
 import sys
 import tarfile
 import tempfile
+import urllib.error
 import urllib.request
 import zipfile
 
@@ -17,20 +22,150 @@ BLENDER_VERSION_REGEX = re.compile(r'\d+\.\d+')
 # Regex used to extract the Python version number from the output of the Python '--version' command.
 PYTHON_VERSION_REGEX = re.compile(r'\d+\.\d+\.\d+')
 
+# Regex matching the names of members under the Include directory of a CPython source archive from GitHub.
+PYTHON_INCLUDE_MEMBER_REGEX = re.compile(r'^cpython-[^/]+/Include/')
+
+# URL from which the get-pip.py script is downloaded.
+GET_PIP_URL = 'https://bootstrap.pypa.io/get-pip.py'
+
+# URL opener shared by all downloads. Every file the installer downloads is either already compressed or decompressed
+# by the installer itself, so the server is asked not to apply any additional content encoding.
+URL_OPENER = urllib.request.build_opener()
+URL_OPENER.addheaders = [('Accept-Encoding', 'identity')] + URL_OPENER.addheaders
+
+# Buffer size, in bytes, used when writing downloaded files to disk.
+DOWNLOAD_BUFFER_SIZE = 2 * 1024 * 1024
+
+# Buffer size, in bytes, used when decompressing archives as they are streamed from the network.
+ARCHIVE_STREAM_BUFFER_SIZE = 2 * 1024 * 1024
+
+
+def get_cache_dir(platform_is_macos, platform_is_windows):
+    """Gets the directory in which downloaded files are cached between runs of the installer.
+    Returns the path to the cache directory, which may not exist yet.
+    platform_is_macos - Boolean indicating whether we are installing on a MacOS machine.
+    platform_is_windows - Boolean indicating whether we are installing on a Windows machine.
+    """
+    home_path = os.path.expanduser('~')
+    if platform_is_windows:
+        cache_parent_path = os.environ.get('LOCALAPPDATA', os.path.join(home_path, 'AppData', 'Local'))
+    elif platform_is_macos:
+        cache_parent_path = os.path.join(home_path, 'Library', 'Caches')
+    else:
+        cache_parent_path = os.environ.get('XDG_CACHE_HOME', os.path.join(home_path, '.cache'))
+    return os.path.join(cache_parent_path, 'view-carve')
+
+
+def file_sha256(file_path):
+    """Computes the SHA-256 digest of the specified file.
+    Returns the digest as a hexadecimal string.
+    file_path - Path to the file.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_download(url, cache_dir):
+    """Downloads the file at the specified URL into the download cache.
+    If the file is already cached, the server is asked whether the cached copy is still current (using its ETag), and
+    the file is only downloaded again if it has changed. Cached copies whose SHA-256 digest no longer matches the
+    digest recorded at download time are discarded.
+    Returns the path to the cached file.
+    url - URL of the file to download.
+    cache_dir - Path to the download cache directory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+    metadata_path = cached_path + '.json'
+
+    # Load the metadata for the cached copy, if there is a valid one.
+    metadata = None
+    if os.access(cached_path, os.F_OK) and os.access(metadata_path, os.F_OK):
+        try:
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+        except (OSError, ValueError):
+            metadata = None
+        if not isinstance(metadata, dict) or file_sha256(cached_path) != metadata.get('sha256'):
+            metadata = None
+
+    # Download the file, unless the server reports that the cached copy is still current.
+    request = urllib.request.Request(url)
+    if metadata is not None and metadata.get('etag') is not None:
+        request.add_header('If-None-Match', metadata['etag'])
+    partial_path = cached_path + '.part'
+    try:
+        with URL_OPENER.open(request) as response, \
+                open(partial_path, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as partial_file:
+            shutil.copyfileobj(response, partial_file, DOWNLOAD_BUFFER_SIZE)
+            etag = response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and metadata is not None:
+            return cached_path
+        raise e
+    os.replace(partial_path, cached_path)
+
+    # Write the metadata to a partial file first, so that an interrupted write can't leave a truncated metadata file.
+    partial_metadata_path = metadata_path + '.part'
+    with open(partial_metadata_path, 'w') as metadata_file:
+        json.dump({'url': url, 'etag': etag, 'sha256': file_sha256(cached_path)}, metadata_file)
+    os.replace(partial_metadata_path, metadata_path)
+
+    return cached_path
+
+
+def copy_file_if_changed(src_path, dst_path):
+    """Same as shutil.copy2, but skips the copy if the destination file already exists with the same size and
+    modification time as the source file.
+    Returns the destination path.
+    src_path - Path to the file to copy.
+    dst_path - Path to which the file should be copied.
+    """
+    if os.access(dst_path, os.F_OK):
+        src_stat = os.stat(src_path)
+        dst_stat = os.stat(dst_path)
+        if src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+            return dst_path
+    return shutil.copy2(src_path, dst_path)
+
+
+def remove_stale_entries(src_path, dst_path):
+    """Removes everything from a destination directory tree that does not exist, with the same type (file or
+    directory), in the corresponding source directory tree.
+    Intended for use before copying the source tree over an existing copy, so that files which have been removed from
+    the source don't linger in the destination.
+    src_path - Path to the source directory.
+    dst_path - Path to the destination directory.
+    """
+    for dst_entry in os.scandir(dst_path):
+        src_entry_path = os.path.join(src_path, dst_entry.name)
+        if dst_entry.is_dir(follow_symlinks=False):
+            if os.path.isdir(src_entry_path):
+                remove_stale_entries(src_entry_path, dst_entry.path)
+            else:
+                shutil.rmtree(dst_entry.path)
+        elif not os.path.isfile(src_entry_path):
+            os.remove(dst_entry.path)
+
 
 def find_python_exe(python_path):
     """Finds the Python executable within the specified Python installation.
     Returns the path to the Python executable.
     python_path - Path to the top directory of the Python installation.
     """
+    # The name checks come first since they don't touch the filesystem, so only likely candidates need to be checked
+    # for executability.
     def is_python_exe(dir_entry):
-        return dir_entry.is_file() and os.access(dir_entry.path, os.X_OK) and not dir_entry.name.endswith('.dll') \
-               and not dir_entry.name.endswith('.so') and dir_entry.name.startswith('python') \
-               and dir_entry.name != 'pythonw.exe'
+        return dir_entry.name.startswith('python') and not dir_entry.name.endswith(('.dll', '.so')) \
+               and dir_entry.name != 'pythonw.exe' and dir_entry.is_file() and os.access(dir_entry.path, os.X_OK)
 
     python_exe_paths = [dir_entry.path for dir_entry in os.scandir(python_path) if is_python_exe(dir_entry)]
-    if os.path.exists(os.path.join(python_path, 'bin')):
-        python_exe_paths += [dir_entry.path for dir_entry in os.scandir(os.path.join(python_path, 'bin'))
+    python_bin_path = os.path.join(python_path, 'bin')
+    if os.path.exists(python_bin_path):
+        python_exe_paths += [dir_entry.path for dir_entry in os.scandir(python_bin_path)
                              if is_python_exe(dir_entry)]
     if len(python_exe_paths) != 1:
         raise ValueError('Failed to find Python executable.')
@@ -42,29 +177,13 @@ def find_python_libs(python_path):
     Returns the path to the libraries directory.
     python_path - Path to the top directory of the Python installation.
     """
-    python_lib_paths = [dir_entry.path for dir_entry in os.scandir(os.path.join(python_path, 'lib'))
-                        if dir_entry.is_dir()]
+    python_lib_path = os.path.join(python_path, 'lib')
+    python_lib_paths = [dir_entry.path for dir_entry in os.scandir(python_lib_path) if dir_entry.is_dir()]
     if len(python_lib_paths) != 1:
-        python_lib_paths = [os.path.join(python_path, 'lib')]
+        python_lib_paths = [python_lib_path]
     return python_lib_paths[0]
 
 
-def find_pip_exe(python_path, platform_is_windows):
-    """Finds the Pip executable within the specified Python installation, assuming Pip is installed.
-    Returns the path to the Pip executable.
-    python_path - Path to the top directory of the Python installation.
-    platform_is_windows - Boolean indicating whether we are installing on a Windows machine.
-    """
-    pip_exe_name = 'pip.exe' if platform_is_windows else 'pip'
-    pip_exe_possible_paths = [os.path.join(python_path, pip_exe_name), os.path.join(python_path, 'bin', pip_exe_name),
-                              os.path.join(python_path, 'Scripts', pip_exe_name),
-                              os.path.join(python_path, 'scripts', pip_exe_name)]
-    pip_exe_paths = [path for path in pip_exe_possible_paths if os.access(path, os.X_OK)]
-    if len(pip_exe_paths) == 0:
-        raise ValueError('Failed to find Pip executable.')
-    return pip_exe_paths[0]
-
-
 def get_blender_version(blender_path, platform_is_macos):
     """Gets the version of Blender, given the path to the Blender installation.
     Returns the Blender version as a string.
@@ -77,13 +196,15 @@ def get_blender_version(blender_path, platform_is_macos):
     else:
         blender_exe_path = os.path.join(blender_path, 'blender')
 
-    # Invoke the Blender executable with '--version' to get the version info.
-    with os.popen(str(blender_exe_path) + ' --version') as blender_version_pipe:
-        blender_version_output_line = blender_version_pipe.readline()
-        blender_version_strings = re.findall(BLENDER_VERSION_REGEX, blender_version_output_line)
-        if len(blender_version_strings) != 1:
-            raise ValueError('Could not find version number in Blender\'s \'--version\' output.')
-        return blender_version_strings[0]
+    # Invoke the Blender executable with '--version' to get the version info. The executable is run directly rather than
+    # through a shell.
+    blender_version_output = subprocess.run([blender_exe_path, '--version'], stdout=subprocess.PIPE,
+                                            universal_newlines=True, check=True).stdout
+    blender_version_output_line = blender_version_output.splitlines()[0] if len(blender_version_output) > 0 else ''
+    blender_version_match = BLENDER_VERSION_REGEX.search(blender_version_output_line)
+    if blender_version_match is None:
+        raise ValueError('Could not find version number in Blender\'s \'--version\' output.')
+    return blender_version_match.group(0)
 
 
 def get_blender_python_paths(blender_path, blender_version, platform_is_macos):
@@ -102,27 +223,105 @@ def get_blender_python_paths(blender_path, blender_version, platform_is_macos):
     return python_path, find_python_exe(python_path)
 
 
+def exe_is_64bit(exe_path):
+    """Determines whether an executable is 64-bit by inspecting its ELF, PE, or Mach-O header.
+    Returns true if the executable is 64-bit, false if it is 32-bit, or None if the header format is not recognized
+    (e.g. for Mach-O universal binaries, which may contain both).
+    exe_path - Path to the executable.
+    """
+    with open(exe_path, 'rb') as exe_file:
+        header = exe_file.read(64)
+
+        # ELF: The EI_CLASS byte is 2 for 64-bit executables.
+        if header[:4] == b'\x7fELF':
+            return header[4] == 2
+
+        # PE: The Machine field follows the 'PE\0\0' signature, whose offset is stored at 0x3c.
+        if header[:2] == b'MZ' and len(header) >= 0x40:
+            pe_offset = int.from_bytes(header[0x3c:0x40], 'little')
+            exe_file.seek(pe_offset + 4)
+            machine = int.from_bytes(exe_file.read(2), 'little')
+            return machine in {0x8664, 0xaa64, 0x200}
+
+    # Mach-O: The magic number distinguishes 32-bit from 64-bit executables.
+    if header[:4] in {b'\xcf\xfa\xed\xfe', b'\xfe\xed\xfa\xcf'}:
+        return True
+    if header[:4] in {b'\xce\xfa\xed\xfe', b'\xfe\xed\xfa\xce'}:
+        return False
+
+    return None
+
+
 def get_python_version(python_exe_path):
     """Gets version information for the given Python executable.
     Returns a 2-tuple containing the Python version as a string and a boolean indicating whether the Python executable
     is 64-bit (true) or 32-bit (false).
     python_exe_path - Path to the Python executable.
     """
-    with os.popen(str(python_exe_path) + ' --version') as python_version_pipe:
-        python_version_output_line = python_version_pipe.readline()
-        python_version_strings = re.findall(PYTHON_VERSION_REGEX, python_version_output_line)
-        if len(python_version_strings) != 1:
-            raise ValueError('Could not find version number in Python\'s \'--version\' output.')
-        python_version = python_version_strings[0]
-
-        python_arch_cmd = str(python_exe_path) + ' -c "import sys; print(sys.maxsize > 2**32)"'
-        with os.popen(python_arch_cmd) as python_arch_pipe:
-            python_is_64bit = bool(python_arch_pipe.readline())
-
-        return python_version, python_is_64bit
-
-
-def make_temp_python(parent_dir, blender_python_path, python_version, python_is_64bit, platform_is_windows):
+    # Query the version without going through a shell.
+    python_version_output = subprocess.run([python_exe_path, '--version'], stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, universal_newlines=True, check=True).stdout
+    python_version_output_line = python_version_output.splitlines()[0] if len(python_version_output) > 0 else ''
+    python_version_match = PYTHON_VERSION_REGEX.search(python_version_output_line)
+    if python_version_match is None:
+        raise ValueError('Could not find version number in Python\'s \'--version\' output.')
+    python_version = python_version_match.group(0)
+
+    # Determine the bit width from the executable's header if possible. Otherwise, ask the interpreter.
+    python_is_64bit = exe_is_64bit(python_exe_path)
+    if python_is_64bit is None:
+        python_arch_cmd = [python_exe_path, '-c', 'import sys; print(sys.maxsize > 2**32)']
+        python_arch_output = subprocess.run(python_arch_cmd, stdout=subprocess.PIPE, universal_newlines=True,
+                                            check=True).stdout
+        python_is_64bit = python_arch_output.strip() == 'True'
+
+    return python_version, python_is_64bit
+
+
+def download_python_headers(python_version, cache_dir):
+    """Downloads the header files from the source code of the specified Python version into the download cache, unless
+    they are already cached.
+    The source archive is decompressed as it is downloaded, and only the members under its Include directory are
+    extracted. The archive itself is never written to disk. Since GitHub's archives list members in sorted path order,
+    the download is stopped as soon as the Include directory has been passed, so most of the archive is never fetched.
+    Returns the path to the directory containing the header files.
+    python_version - The Python version whose header files should be downloaded, as a string.
+    cache_dir - Path to the download cache directory.
+    """
+    # Released versions never change, so cached headers never need to be downloaded again.
+    cached_include_path = os.path.join(cache_dir, 'python-include-{}'.format(python_version))
+    if os.path.isdir(cached_include_path):
+        return cached_include_path
+
+    # Extract into a scratch directory first, so that an interrupted download can't leave partial headers in the cache.
+    os.makedirs(cache_dir, exist_ok=True)
+    extract_path = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        python_src_request_url = 'https://github.com/python/cpython/archive/refs/tags/v{}.tar.gz'.format(
+            python_version)
+        with URL_OPENER.open(python_src_request_url) as python_src_archive_response, \
+                tarfile.open(fileobj=python_src_archive_response, mode='r|gz',
+                             bufsize=ARCHIVE_STREAM_BUFFER_SIZE) as python_src_tar:
+
+            def include_members():
+                found_include = False
+                for member in python_src_tar:
+                    if PYTHON_INCLUDE_MEMBER_REGEX.match(member.name):
+                        found_include = True
+                        yield member
+                    elif found_include:
+                        return
+
+            python_src_tar.extractall(path=extract_path, members=include_members())
+        os.replace(os.path.join(extract_path, 'cpython-{}'.format(python_version), 'Include'), cached_include_path)
+    finally:
+        shutil.rmtree(extract_path, ignore_errors=True)
+
+    return cached_include_path
+
+
+def make_temp_python(parent_dir, blender_python_path, python_version, python_is_64bit, platform_is_windows, cache_dir,
+                     executor):
     """Creates a Python installation of the specified version, for temporary use in the installation process.
     Returns the path to the new Python installation.
     dir - Directory in which the Python installation should be created.
@@ -131,6 +330,8 @@ def make_temp_python(parent_dir, blender_python_path, python_version, python_is_
     python_version - The Python version for the new Python installation, as a string.
     python_is_64bit - Boolean indicating whether the Python interpreter should be 64-bit (true) or 32-bit (false).
     platform_is_windows - Boolean indicating whether we are installing on a Windows machine.
+    cache_dir - Path to the download cache directory.
+    executor - concurrent.futures.Executor used to run downloads in the background while local files are copied.
     """
     output_path = os.path.join(parent_dir, 'python')
 
@@ -142,88 +343,95 @@ def make_temp_python(parent_dir, blender_python_path, python_version, python_is_
             python_request_url = 'https://www.nuget.org/api/v2/package/python/{}'.format(python_version)
         else:
             python_request_url = 'https://www.nuget.org/api/v2/package/pythonx86/{}'.format(python_version)
-        python_archive_path = os.path.join(parent_dir, 'python-from-nuget.zip')
-        with urllib.request.urlopen(python_request_url) as python_archive_response, \
-                open(python_archive_path, 'wb') as python_archive_out:
-            shutil.copyfileobj(python_archive_response, python_archive_out)
+        python_archive_path = cached_download(python_request_url, cache_dir)
 
-        # Decompress the archive.
+        # Decompress the required files from the archive directly into the output directory. Only the tools directory
+        # contains the Python installation; the rest of the package is NuGet metadata.
         print('    Decompressing Python archive...')
         with zipfile.ZipFile(python_archive_path) as python_archive_zip:
-            python_archive_zip.extractall(path=os.path.join(parent_dir, 'python-from-nuget'))
-
-        # Copy the required files from the archive.
-        shutil.copytree(os.path.join(parent_dir, 'python-from-nuget', 'tools'), os.path.join(output_path, 'tools'))
+            tools_member_names = [name for name in python_archive_zip.namelist() if name.startswith('tools/')]
+            python_archive_zip.extractall(path=output_path, members=tools_member_names)
 
         return os.path.join(output_path, 'tools')
 
     # On other platforms, only the Python include files are typically missing from Blender's Python installation, so we
-    # just copy Python from Blender and download the include files.
+    # just copy Python from Blender and download the include files if needed.
     else:
+        # Some Blender builds do include the header files, in which case nothing needs to be downloaded.
+        blender_include_path = os.path.join(blender_python_path, 'include')
+        blender_has_headers = os.path.isfile(os.path.join(blender_include_path, 'Python.h')) \
+            or len(glob.glob(os.path.join(blender_include_path, 'python*', 'Python.h'))) > 0
+
+        # Otherwise, download the Python header files in the background while Python is copied from Blender.
+        python_include_future = None
+        if not blender_has_headers:
+            print('    Downloading Python headers...')
+            python_include_future = executor.submit(download_python_headers, python_version, cache_dir)
+
         # Copy Python from Blender.
         print('    Copying Python files from Blender...')
         shutil.copytree(blender_python_path, output_path)
-
-        # Download the Python source archive.
-        print('    Downloading Python source...')
-        python_src_request_url = 'https://www.python.org/ftp/python/{0}/Python-{0}.tgz'.format(python_version)
-        python_src_archive_path = os.path.join(parent_dir, 'python-src.tgz')
-        with urllib.request.urlopen(python_src_request_url) as python_src_archive_response, \
-                open(python_src_archive_path, 'wb') as python_src_archive_out:
-            shutil.copyfileobj(python_src_archive_response, python_src_archive_out)
-
-        # Decompress the source archive.
-        print('    Decompressing Python source archive...')
-        python_src_path = os.path.join(parent_dir, 'python-src')
-        with tarfile.open(python_src_archive_path, 'r:gz') as python_src_tar:
-            python_src_tar.extractall(path=python_src_path)
+        if python_include_future is None:
+            return output_path
+        python_include_path = python_include_future.result()
 
         # Figure out the destination directory to which we should copy the header files.
         output_include_path = os.path.join(output_path, 'include')
-        if not os.path.exists(output_include_path):
-            os.mkdir(output_include_path)
-        include_subpaths = [dir_entry.path for dir_entry in os.scandir(output_include_path)
-                            if dir_entry.is_dir() and dir_entry.name.startswith('python')]
-        if len(include_subpaths) == 1:
-            output_include_path = os.path.join(output_include_path, include_subpaths[0])
+        if os.path.isdir(output_include_path):
+            include_subpaths = [dir_entry.path for dir_entry in os.scandir(output_include_path)
+                                if dir_entry.is_dir() and dir_entry.name.startswith('python')]
+            if len(include_subpaths) == 1:
+                output_include_path = os.path.join(output_include_path, include_subpaths[0])
 
         # Copy all header files from the Python source distribution into our temporary copy of Blender's Python
-        # installation.
+        # installation, merging them with any headers that are already there.
         print('    Copying header files...')
-        for dir_entry in os.scandir(os.path.join(python_src_path, 'Python-{}'.format(python_version), 'Include')):
-            if dir_entry.is_dir():
-                dir_copy_path = os.path.join(output_include_path, dir_entry.name)
-                if os.access(dir_copy_path, os.F_OK):
-                    os.rmdir(dir_copy_path)
-                shutil.copytree(dir_entry.path, dir_copy_path)
-            else:
-                shutil.copyfile(dir_entry.path, os.path.join(output_include_path, dir_entry.name))
+        shutil.copytree(python_include_path, output_include_path, dirs_exist_ok=True, copy_function=shutil.copyfile)
 
         return output_path
 
 
-def install_pip(temp_dir, python_exe_path):
+def install_pip(get_pip_path, python_exe_path):
     """Installs Pip for the specified Python executable.
-    temp_dir - Directory in which to store temporary files generated by the operation.
+    get_pip_path - Path to a downloaded copy of the get-pip.py script.
     python_exe_path - Path to the Python executable.
     """
-    # Download get-pip.py.
-    get_pip_request_url = 'https://bootstrap.pypa.io/get-pip.py'
-    get_pip_path = os.path.join(temp_dir, 'get-pip.py')
-    with urllib.request.urlopen(get_pip_request_url) as get_pip_response, open(get_pip_path, 'wb') as get_pip_out:
-        shutil.copyfileobj(get_pip_response, get_pip_out)
-
     # Run get-pip.py to install Pip.
-    subprocess.run([python_exe_path, get_pip_path])
+    subprocess.run([python_exe_path, get_pip_path], check=True)
 
 
-def install_dependencies(pip_exe_path):
+def install_dependencies(python_exe_path):
     """Installs the plugin's dependencies using Pip.
-    pip_exe_path - Path to the Pip executable.
+    python_exe_path - Path to the Python executable for which Pip has been installed.
+    """
+    # Install everything with a single Pip invocation, so that Pip only needs to run its resolver once. Pip is run as a
+    # module of the Python executable, so its own executable doesn't need to be found. Bytecode compilation is skipped
+    # because Blender will compile the modules itself when they are first imported, and binary wheels are preferred
+    # where available so that native code doesn't need to be compiled.
+    subprocess.run([python_exe_path, '-m', 'pip', 'install', '--prefer-binary', '--no-compile',
+                    '--disable-pip-version-check', 'Shapely', 'triangle'], check=True)
+
+
+def move_dependency(src_path, dst_path):
+    """Moves an installed dependency (file or directory) from the temporary Python installation to its final location,
+    replacing anything that already exists at the destination.
+    The dependency is renamed into place if possible, and copied if the rename fails (e.g. because the source and
+    destination are on different filesystems).
+    src_path - Path to the dependency in the temporary Python installation.
+    dst_path - Path to which the dependency should be moved.
     """
-    subprocess.run([pip_exe_path, 'install', 'ordered-set'])
-    subprocess.run([pip_exe_path, 'install', 'Shapely'])
-    subprocess.run([pip_exe_path, 'install', 'triangle'])
+    if os.path.isdir(dst_path):
+        shutil.rmtree(dst_path)
+    elif os.access(dst_path, os.F_OK):
+        os.remove(dst_path)
+
+    try:
+        os.replace(src_path, dst_path)
+    except OSError:
+        if os.path.isdir(src_path):
+            shutil.copytree(src_path, dst_path)
+        else:
+            shutil.copyfile(src_path, dst_path)
 
 
 def final_install(python_path, custom_blender_config_path, blender_version, platform_is_macos, platform_is_windows):
@@ -237,14 +445,14 @@ def final_install(python_path, custom_blender_config_path, blender_version, plat
     """
     # Find the user's Blender configuration directory.
     if custom_blender_config_path is None:
+        home_path = os.path.expanduser('~')
         if platform_is_windows:
-            blender_config_path = os.path.join(os.path.expanduser('~'), 'AppData', 'Roaming', 'Blender Foundation',
-                                               'Blender', blender_version)
-        elif platform_is_macos:
-            blender_config_path = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'Blender',
+            blender_config_path = os.path.join(home_path, 'AppData', 'Roaming', 'Blender Foundation', 'Blender',
                                                blender_version)
+        elif platform_is_macos:
+            blender_config_path = os.path.join(home_path, 'Library', 'Application Support', 'Blender', blender_version)
         else:
-            blender_config_path = os.path.join(os.path.expanduser('~'), '.config', 'blender', blender_version)
+            blender_config_path = os.path.join(home_path, '.config', 'blender', blender_version)
     else:
         blender_config_path = custom_blender_config_path
     blender_config_addons_path = os.path.join(blender_config_path, 'scripts', 'addons')
@@ -252,42 +460,45 @@ def final_install(python_path, custom_blender_config_path, blender_version, plat
 
     # Find the dependencies that need to be copied.
     python_site_packages_path = os.path.join(find_python_libs(python_path), 'site-packages')
-    python_ordered_set_path = os.path.join(python_site_packages_path, 'ordered_set.py')
     python_shapely_path = os.path.join(python_site_packages_path, 'shapely')
     python_triangle_path = os.path.join(python_site_packages_path, 'triangle')
 
-    # Copy the dependencies into the Blender configuration directory.
-    print('    Copying dependencies to Blender config directory...')
-    os.makedirs(blender_config_addons_path, exist_ok=True)
-    os.makedirs(blender_config_modules_path, exist_ok=True)
-    blender_config_ordered_set_path = os.path.join(blender_config_modules_path, 'ordered_set.py')
-    blender_config_shapely_path = os.path.join(blender_config_modules_path, 'shapely')
-    blender_config_triangle_path = os.path.join(blender_config_modules_path, 'triangle')
-    if os.access(blender_config_ordered_set_path, os.F_OK):
-        os.remove(blender_config_ordered_set_path)
-    shutil.copyfile(python_ordered_set_path, blender_config_ordered_set_path)
-    if os.access(blender_config_shapely_path, os.F_OK):
-        shutil.rmtree(blender_config_shapely_path)
-    shutil.copytree(python_shapely_path, blender_config_shapely_path)
-    if os.access(blender_config_triangle_path, os.F_OK):
-        shutil.rmtree(blender_config_triangle_path)
-    shutil.copytree(python_triangle_path, blender_config_triangle_path)
-
     # Find the plugin's source code.
     view_carve_src_path = sys.path[0]
     if len(view_carve_src_path) == 0:
         view_carve_src_path = os.getcwd()
     view_carve_addon_src_path = os.path.join(view_carve_src_path, 'src', 'view_carve')
 
-    # Copy the plugin code into the Blender configuration directory.
-    print('    Copying View Carve to Blender config directory...')
+    # Copy over any existing installation in place, so that files which haven't changed since the last install are
+    # skipped. Files left over from older versions of the plugin are removed first.
+    def copy_view_carve(dst_path):
+        if os.path.isdir(dst_path):
+            remove_stale_entries(view_carve_addon_src_path, dst_path)
+        shutil.copytree(view_carve_addon_src_path, dst_path, dirs_exist_ok=True, copy_function=copy_file_if_changed)
+
+    # Move the dependencies and copy the plugin code into the Blender configuration directory. The destinations are
+    # disjoint, so the operations are run concurrently.
+    print('    Copying dependencies and View Carve to Blender config directory...')
+    os.makedirs(blender_config_addons_path, exist_ok=True)
+    os.makedirs(blender_config_modules_path, exist_ok=True)
+    blender_config_shapely_path = os.path.join(blender_config_modules_path, 'shapely')
+    blender_config_triangle_path = os.path.join(blender_config_modules_path, 'triangle')
     blender_config_view_carve_path = os.path.join(blender_config_addons_path, 'view_carve')
-    if os.access(blender_config_view_carve_path, os.F_OK):
-        shutil.rmtree(blender_config_view_carve_path)
-    shutil.copytree(view_carve_addon_src_path, blender_config_view_carve_path)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as install_executor:
+        install_futures = [
+            install_executor.submit(move_dependency, python_shapely_path, blender_config_shapely_path),
+            install_executor.submit(move_dependency, python_triangle_path, blender_config_triangle_path),
+            install_executor.submit(copy_view_carve, blender_config_view_carve_path),
+        ]
+        for install_future in install_futures:
+            install_future.result()
 
 
 def main():
+    # The installer relies on shutil.copytree's dirs_exist_ok argument, which was added in Python 3.8.
+    if sys.version_info < (3, 8):
+        sys.exit('The View Carve installer requires Python 3.8 or later.')
+
     # Get platform information.
     platform_is_windows = sys.platform.startswith('win32') or sys.platform.startswith('cygwin')
     platform_is_macos = sys.platform.startswith('darwin')
@@ -308,8 +519,15 @@ def main():
                                                                             platform_is_macos)
     blender_python_version, blender_python_is_64bit = get_python_version(blender_python_exe_path)
 
-    # Create a temporary directory for storing temporary files generated by the rest of the installation process.
-    with tempfile.TemporaryDirectory() as temp_dir:
+    # Downloaded files are cached between runs, so that repeated installs don't need to fetch everything again.
+    cache_dir = get_cache_dir(platform_is_macos, platform_is_windows)
+
+    # Create a temporary directory for storing temporary files generated by the rest of the installation process. Files
+    # that need to be downloaded are fetched in the background, so that network latency overlaps with local work.
+    with tempfile.TemporaryDirectory() as temp_dir, concurrent.futures.ThreadPoolExecutor() as executor:
+
+        # Start downloading get-pip.py right away, since it doesn't depend on anything else.
+        get_pip_future = executor.submit(cached_download, GET_PIP_URL, cache_dir)
 
         # Blender's Python installation usually lacks some files needed for installing Python dependencies that include
         # native code. For this reason, we can't just copy Blender's Python installation to install the required
@@ -317,17 +535,16 @@ def main():
         # uses, with a combination of files taken from Blender and files downloaded from the Python website or NuGet.
         print('Creating temporary Python installation...')
         temp_python_path = make_temp_python(temp_dir, blender_python_path, blender_python_version,
-                                            blender_python_is_64bit, platform_is_windows)
+                                            blender_python_is_64bit, platform_is_windows, cache_dir, executor)
         temp_python_exe_path = find_python_exe(temp_python_path)
 
         # Install Pip into the temporary Python installation.
         print('Installing Pip...')
-        install_pip(temp_dir, temp_python_exe_path)
-        temp_pip_exe_path = find_pip_exe(temp_python_path, platform_is_windows)
+        install_pip(get_pip_future.result(), temp_python_exe_path)
 
         # Use Pip to install the plugin's dependencies.
         print('Installing dependencies with Pip...')
-        install_dependencies(temp_pip_exe_path)
+        install_dependencies(temp_python_exe_path)
 
         # Copy the dependencies and the plugin code into the user's Blender configuration directory.
         print('Installing View Carve plugin...')
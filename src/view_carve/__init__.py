@@ -1,8 +1,9 @@
 """Blender addon Python module - Projection Carving Tool"""
 
+import importlib
+
 import bpy
 
-from . import stencil_op
 from . import menus
 
 bl_info = {
@@ -15,17 +16,22 @@ bl_info = {
     'tracker_url': 'https://github.com/allen-marshall/blender-view-carve/issues',
 }
 
-basic_register, basic_unregister = bpy.utils.register_classes_factory((stencil_op.VIEW_CARVE_OT_stencil,))
+# Registration state, filled in by register(). The operator module (and with it the Shapely and triangle dependencies)
+# is only imported when register() runs, rather than whenever this package is imported.
+_state = {}
 
 
 def register():
+    stencil_op = importlib.import_module('.stencil_op', __package__)
+    basic_register, basic_unregister = bpy.utils.register_classes_factory((stencil_op.VIEW_CARVE_OT_stencil,))
     basic_register()
+    _state['basic_unregister'] = basic_unregister
     bpy.types.VIEW3D_MT_object.append(menus.vp_object_menu_extension)
 
 
 def unregister():
     bpy.types.VIEW3D_MT_object.remove(menus.vp_object_menu_extension)
-    basic_unregister()
+    _state.pop('basic_unregister')()
 
 
 if __name__ == '__main__':
@@ -1,27 +1,43 @@
 """Functionality for projecting objects through the viewport."""
 
 
-import collections
+import os
 
 import bpy
 import bmesh
-import mathutils
-
-import ordered_set
+import numpy as np
 
+import shapely
 from shapely.geometry import LineString, LinearRing, Polygon, MultiPolygon
 from shapely.geometry.collection import GeometryCollection
 import shapely.ops
 
+try:
+    from shapely.validation import make_valid
+except ImportError:
+    # make_valid is only available in Shapely 1.8 and later.
+    make_valid = None
+
 import triangle
 
+# Whether generated stencil meshes should be checked with Mesh.validate. The stencil meshes are built to be valid, so
+# this is only needed when debugging, and can be enabled by setting the VIEW_CARVE_VALIDATE_MESHES environment variable.
+_VALIDATE_MESHES = bool(os.environ.get('VIEW_CARVE_VALIDATE_MESHES'))
+
+# Resolution of the grid onto which vertex coordinates are quantized when deduplicating the vertices of a stencil shape
+# for triangulation, relative to the shape's largest absolute coordinate.
+_VERTEX_KEY_RESOLUTION = 1e9
+
+# Whether the installed Shapely version (2.0 or later) has the vectorized array API.
+_SHAPELY_HAS_ARRAY_API = hasattr(shapely, 'polygons')
+
 
 def carvers_to_stencil_meshes(vp_view_matrix, is_orthographic, far_dist, buffer_ratio, carvers, delete_carvers,
-                              union_stencils, context):
+                              union_stencils, context, merge_stencils=False):
     """Projects the specified carver objects through the 3D viewport to get stencil meshes.
     Warning: This function may change the selection state of objects in the scene.
-    Returns a list of newly created stencil mesh objects that have been linked to the scene. If union_stencils is true,
-    the returned list will contain only one stencil object.
+    Returns a list of newly created stencil mesh objects that have been linked to the scene. If union_stencils or
+    merge_stencils is true, the returned list will contain only one stencil object.
     Raises ValueError if the provided list of carvers contains objects with vertices that are currently behind the
         viewport camera, or if Blender is not currently in Object Mode.
     vp_view_matrix - The viewport camera's view matrix (in other words, a transformation matrix from world space
@@ -35,34 +51,47 @@ def carvers_to_stencil_meshes(vp_view_matrix, is_orthographic, far_dist, buffer_
     union_stencils - Boolean indicating whether to create a single unioned stencil (true), or a separate stencil for
         each carver (false).
     context - The Blender context.
+    merge_stencils - Boolean indicating whether to combine the separate stencils into a single stencil. Unlike with
+        union_stencils, each carver's shape is grown by its own size before the shapes are unioned, so the combined
+        stencil covers the same region as the separate stencils would. Default: False
     """
     if context.mode != 'OBJECT':
         raise ValueError('Not in Object Mode')
 
-    # Convert each carver object to a 2D stencil shape.
-    stencil_shapes = [_carver_to_stencil_shape(vp_view_matrix, is_orthographic, carver, delete_carvers, context)
-                      for carver in carvers]
-    stencil_shapes = [shape for shape in stencil_shapes if shape is not None]
+    # Nothing to project if there are no carvers.
+    if len(carvers) <= 0:
+        return []
 
-    # Union the 2D shapes if we are in union_stencils mode.
-    if union_stencils and len(stencil_shapes) > 0:
+    # Convert each carver object to a 2D stencil shape, dropping carvers that produced no shape.
+    stencil_shapes = [shape for shape in (_carver_to_stencil_shape(vp_view_matrix, is_orthographic, carver,
+                                                                   delete_carvers, context)
+                                          for carver in carvers)
+                      if shape is not None]
+
+    # Union the 2D shapes if we are in union_stencils mode. Each shape is already the result of a union, so there is
+    # nothing to do when there is only one.
+    if union_stencils and len(stencil_shapes) > 1:
+        stencil_shapes = [shapely.ops.unary_union(stencil_shapes)]
+
+    # Grow the stencil shapes, then combine them if we are in merge_stencils mode.
+    stencil_shapes = [_grow_stencil_shape(shape, buffer_ratio) for shape in stencil_shapes]
+    if merge_stencils and len(stencil_shapes) > 1:
         stencil_shapes = [shapely.ops.unary_union(stencil_shapes)]
 
     # Convert each 2D stencil shape to a 3D stencil mesh.
-    vp_to_world_matrix = vp_view_matrix.inverted()
+    vp_to_world_matrix = np.array(vp_view_matrix.inverted(), dtype=np.float64)
     stencil_mesh_objs = []
     try:
         for shape in stencil_shapes:
-            stencil_mesh_obj = _stencil_shape_to_stencil_mesh(vp_to_world_matrix, is_orthographic, far_dist,
-                                                              buffer_ratio, shape, context)
+            stencil_mesh_obj = _stencil_shape_to_stencil_mesh(vp_to_world_matrix, is_orthographic, far_dist, shape,
+                                                              context)
             if stencil_mesh_obj is not None:
                 stencil_mesh_objs.append(stencil_mesh_obj)
         return stencil_mesh_objs
 
     except Exception as e:
         # In case of error, try to clean up any partial results owned by Blender.
-        for stencil_mesh_obj in stencil_mesh_objs:
-            bpy.data.objects.remove(stencil_mesh_obj)
+        bpy.data.batch_remove(ids=stencil_mesh_objs)
 
         raise e
 
@@ -134,68 +163,144 @@ def _carver_mesh_to_stencil_shape(to_cam_matrix, is_orthographic, carver_mesh):
 
 def _faced_carver_mesh_to_stencil_shape(to_cam_matrix, is_orthographic, carver_mesh):
     """Same as _carver_mesh_to_stencil_shape, but only for meshes that have at least one face."""
-    # Convert individual faces into stencil shapes.
-
-    def face_to_stencil_shape(face):
-        vert_coords_3d = [carver_mesh.vertices[carver_mesh.loops[loop_idx].vertex_index].co
-                          for loop_idx in face.loop_indices]
-        vert_coords = [_vp_plane_project_pt(to_cam_matrix, is_orthographic, vert) for vert in vert_coords_3d]
-        return Polygon(vert_coords)
-
-    face_stencil_shapes = [face_to_stencil_shape(face) for face in carver_mesh.polygons]
-
-    # Filter out any invalid 2D face shapes. (These can arise e.g. from non-planar faces.)
-    face_stencil_shapes = [shape for shape in face_stencil_shapes if shape.is_valid]
+    # Read the mesh data into flat arrays.
+    vert_coords = np.empty(len(carver_mesh.vertices) * 3, dtype=np.float32)
+    carver_mesh.vertices.foreach_get('co', vert_coords)
+    loop_vert_idxs = np.empty(len(carver_mesh.loops), dtype=np.int32)
+    carver_mesh.loops.foreach_get('vertex_index', loop_vert_idxs)
+    face_loop_starts = np.empty(len(carver_mesh.polygons), dtype=np.int32)
+    carver_mesh.polygons.foreach_get('loop_start', face_loop_starts)
+    face_loop_totals = np.empty(len(carver_mesh.polygons), dtype=np.int32)
+    carver_mesh.polygons.foreach_get('loop_total', face_loop_totals)
+
+    # Project the vertices used by faces, then convert individual faces into stencil shapes by slicing out each face's
+    # loops. Vertices not used by any face are left out, so that they cannot cause a behind-the-camera error.
+    vert_coords = vert_coords.reshape(-1, 3)
+    face_verts_mask = np.zeros(len(vert_coords), dtype=bool)
+    face_verts_mask[loop_vert_idxs] = True
+    vert_coords_2d = np.zeros((len(vert_coords), 2))
+    vert_coords_2d[face_verts_mask] = _vp_plane_project_pts(to_cam_matrix, is_orthographic,
+                                                            vert_coords[face_verts_mask])
+    loop_coords = vert_coords_2d[loop_vert_idxs]
+
+    # Gather the loop coordinates in face order, so that each face's loops are stored contiguously.
+    loop_face_idxs = np.repeat(np.arange(len(face_loop_totals)), face_loop_totals)
+    face_coords_starts = np.cumsum(face_loop_totals) - face_loop_totals
+    loop_offsets = np.arange(len(loop_face_idxs)) - np.repeat(face_coords_starts, face_loop_totals)
+    face_coords = loop_coords[face_loop_starts[loop_face_idxs] + loop_offsets]
+
+    # Invalid 2D face shapes (which can arise e.g. from non-planar faces) need to be filtered out. Strictly convex faces
+    # are always valid, so Shapely only needs to check the others.
+    face_is_valid = _find_convex_faces(face_coords, face_loop_totals)
+    faces_to_check = np.flatnonzero(~face_is_valid)
+
+    if _SHAPELY_HAS_ARRAY_API:
+        # Build all the face polygons in one call, using the face index of each loop to group the loop coordinates
+        # into rings.
+        face_stencil_shapes = shapely.polygons(shapely.linearrings(face_coords, indices=loop_face_idxs))
+        face_is_valid[faces_to_check] = shapely.is_valid(face_stencil_shapes[faces_to_check])
+        face_stencil_shapes = face_stencil_shapes[face_is_valid]
+    else:
+        face_stencil_shapes = [Polygon(face_coords[coords_start:coords_start + loop_total])
+                               for coords_start, loop_total in zip(face_coords_starts, face_loop_totals)]
+        for face_idx in faces_to_check:
+            face_is_valid[face_idx] = face_stencil_shapes[face_idx].is_valid
+        face_stencil_shapes = [shape for shape, is_valid in zip(face_stencil_shapes, face_is_valid) if is_valid]
 
     if len(face_stencil_shapes) <= 0:
         return None
 
-    # Union the face shapes together.
+    # Union the face shapes together. If the union comes out invalid, try to repair it rather than discarding the whole
+    # carver. Repairing can produce lower-dimensional parts, which don't enclose anything and are dropped.
     stencil_shape = shapely.ops.unary_union(face_stencil_shapes)
+    if not stencil_shape.is_valid:
+        if make_valid is None:
+            return None
+        stencil_shape = make_valid(stencil_shape)
+        if stencil_shape.geom_type == 'GeometryCollection':
+            stencil_shape = shapely.ops.unary_union([geom for geom in stencil_shape.geoms
+                                                     if geom.geom_type in ('Polygon', 'MultiPolygon')])
+
+    return stencil_shape if stencil_shape.is_valid and not stencil_shape.is_empty else None
+
+
+def _find_convex_faces(face_coords, face_loop_totals):
+    """Finds the faces whose 2D shapes are strictly convex polygons. Such polygons are always valid.
+    Returns a boolean NumPy array with one entry per face.
+    face_coords - (N, 2) NumPy array of the 2D coordinates of every face's loops, with each face's loops stored
+        contiguously and the faces stored in order.
+    face_loop_totals - NumPy array giving the number of loops in each face.
+    """
+    face_coords_starts = np.cumsum(face_loop_totals) - face_loop_totals
+
+    # Find the index of the next loop around the same face, for every loop.
+    next_loop_idxs = np.arange(1, len(face_coords) + 1)
+    next_loop_idxs[face_coords_starts + face_loop_totals - 1] = face_coords_starts
+
+    # Compute the turn at each corner from the edge entering it and the edge leaving it.
+    edge_vecs = face_coords[next_loop_idxs] - face_coords
+    next_edge_vecs = edge_vecs[next_loop_idxs]
+    turn_crosses = edge_vecs[:, 0] * next_edge_vecs[:, 1] - edge_vecs[:, 1] * next_edge_vecs[:, 0]
+    turn_angles = np.arctan2(turn_crosses, (edge_vecs * next_edge_vecs).sum(axis=1))
 
-    return stencil_shape if stencil_shape.is_valid else None
+    # A polygon is strictly convex if it turns the same way at every corner and winds around only once. (The winding
+    # check rules out star shapes.)
+    turns_left = np.minimum.reduceat(turn_crosses, face_coords_starts) > 0
+    turns_right = np.maximum.reduceat(turn_crosses, face_coords_starts) < 0
+    winds_once = np.abs(np.add.reduceat(turn_angles, face_coords_starts)) < 3 * np.pi
+    return (turns_left | turns_right) & winds_once
 
 
 def _faceless_carver_mesh_to_stencil_shape(to_cam_matrix, is_orthographic, carver_mesh):
     """Same as _carver_mesh_to_stencil_shape, but only for meshes with no faces."""
     # Extract zero or more path shapes from the mesh by following edges. Paths may be open or closed.
 
-    carver_bmesh = bmesh.new()
-    carver_bmesh.from_mesh(carver_mesh)
-
-    if len(list(carver_bmesh.verts)) <= 0:
+    num_verts = len(carver_mesh.vertices)
+    if num_verts <= 0:
         return None
 
+    # Read the mesh data, and build a list of neighboring vertex indices for each vertex.
+    vert_coords = np.empty(num_verts * 3, dtype=np.float32)
+    carver_mesh.vertices.foreach_get('co', vert_coords)
+    vert_coords = vert_coords.reshape(-1, 3)
+    edge_vert_idxs = np.empty(len(carver_mesh.edges) * 2, dtype=np.int32)
+    carver_mesh.edges.foreach_get('vertices', edge_vert_idxs)
+    vert_neighbors = [[] for _ in range(num_verts)]
+    for vert_idx_a, vert_idx_b in edge_vert_idxs.reshape(-1, 2).tolist():
+        vert_neighbors[vert_idx_a].append(vert_idx_b)
+        vert_neighbors[vert_idx_b].append(vert_idx_a)
+    del edge_vert_idxs
+
+    # Vertices that are already part of a path are tracked by index in a flat array.
     vert_paths = []
-    start_verts_to_ignore = set()
-    for start_vert in carver_bmesh.verts:
-        start_edges = start_vert.link_edges
-        start_edges.index_update()
-        if len(start_edges) in {1, 2} and start_vert not in start_verts_to_ignore:
+    start_verts_to_ignore = bytearray(num_verts)
+    for start_vert in range(num_verts):
+        if start_verts_to_ignore[start_vert]:
+            continue
+        start_neighbors = vert_neighbors[start_vert]
+        if len(start_neighbors) in {1, 2}:
             vert_path = [start_vert]
-            path_finished = False
             curr_vert = start_vert
-            curr_edge = start_edges[0]
-            while not path_finished:
-                next_vert = curr_edge.other_vert(curr_vert)
-                next_edges = next_vert.link_edges
-                next_edges.index_update()
+            next_vert = start_neighbors[0]
+            while True:
                 vert_path.append(next_vert)
-                if next_vert == start_vert or len(next_edges) != 2:
-                    path_finished = True
-                else:
-                    curr_edge = next_edges[0] if next_edges[0].other_vert(next_vert) != curr_vert else next_edges[1]
-                    curr_vert = next_vert
+                next_neighbors = vert_neighbors[next_vert]
+                if next_vert == start_vert or len(next_neighbors) != 2:
+                    break
+                following_vert = next_neighbors[0] if next_neighbors[0] != curr_vert else next_neighbors[1]
+                curr_vert = next_vert
+                next_vert = following_vert
             vert_paths.append(vert_path)
-            start_verts_to_ignore.update(vert_path)
+            for vert in vert_path:
+                start_verts_to_ignore[vert] = 1
 
     # Generate the 2D shape.
 
-    paths = [[vert.co for vert in vert_path] for vert_path in vert_paths]
+    paths = [vert_coords[vert_path] for vert_path in vert_paths]
 
     del vert_paths
+    del vert_neighbors
     del start_verts_to_ignore
-    carver_bmesh.free()
 
     return _paths_to_stencil_shape(to_cam_matrix, is_orthographic, paths)
 
@@ -209,13 +314,19 @@ def _carver_gpencil_obj_to_stencil_shape(to_cam_matrix, is_orthographic, carver_
     is_orthographic - Boolean indicating whether the viewport camera is orthographic (true) or perspective (false).
     carver_gpencil - A Blender grease pencil object indicating the carver geometry to use.
     """
-    # Extract a path from each stroke in the grease pencil object.
+    # Extract a path from each stroke in the grease pencil object. Layers with no frame at the current time are skipped.
     paths = []
     for layer in carver_gpencil.data.layers:
-        for stroke in layer.active_frame.strokes:
-            path = [pt.co for pt in stroke.points]
-            if stroke.draw_cyclic and len(path) > 1 and path[0] != path[-1]:
-                path.append(path[0])
+        active_frame = layer.active_frame
+        if active_frame is None:
+            continue
+        for stroke in active_frame.strokes:
+            stroke_pts = stroke.points
+            path = np.empty(len(stroke_pts) * 3, dtype=np.float32)
+            stroke_pts.foreach_get('co', path)
+            path = path.reshape(-1, 3)
+            if stroke.draw_cyclic and len(path) > 1 and not np.array_equal(path[0], path[-1]):
+                path = np.concatenate((path, path[:1]))
             paths.append(path)
 
     # Generate the 2D shape.
@@ -229,10 +340,14 @@ def _paths_to_stencil_shape(to_cam_matrix, is_orthographic, paths):
     Raises ValueError if the paths have vertices that are behind the viewport camera.
     to_cam_matrix - Transformation matrix from the paths' local 3D space to the camera's 3D space.
     is_orthographic - Boolean indicating whether the viewport camera is orthographic (true) or perspective (false).
-    paths - list of lists of 3-tuples indicating the path points in 3D space.
+    paths - list of (N, 3) NumPy arrays indicating the path points in 3D space.
     """
-    # Project paths into the viewport camera's 2D space.
-    paths_2d = [[_vp_plane_project_pt(to_cam_matrix, is_orthographic, pt) for pt in path] for path in paths]
+    # Project paths into the viewport camera's 2D space. All path points are projected together, then split back into
+    # the individual paths.
+    path_ends = np.cumsum([len(path) for path in paths])
+    pts_2d = _vp_plane_project_pts(to_cam_matrix, is_orthographic,
+                                   np.concatenate(paths) if len(paths) > 0 else np.empty((0, 3)))
+    paths_2d = [pts_2d[path_end - len(path):path_end] for path, path_end in zip(paths, path_ends)]
 
     # Convert the 2D paths to Shapely polygons.
     def path_to_shape(path):
@@ -240,11 +355,13 @@ def _paths_to_stencil_shape(to_cam_matrix, is_orthographic, paths):
             return MultiPolygon([])
         linear_ring = LinearRing(path)
         if linear_ring.is_valid:
-            return MultiPolygon(shapely.ops.polygonize([linear_ring]))
+            # A valid ring encloses exactly one region, so it can be used as a polygon shell directly instead of being
+            # polygonized.
+            return MultiPolygon([Polygon(linear_ring)])
         else:
             line_string = LineString(path)
-            if line_string.is_simple and path[0] != path[-1]:
-                line_string = LineString(path + [path[0]])
+            if line_string.is_simple and not np.array_equal(path[0], path[-1]):
+                line_string = LineString(np.concatenate((path, path[:1])))
             # For self-intersecting paths, we want to create a polygon for each region enclosed by the path. The code
             # here uses a bit of a hack to achieve this.
             return MultiPolygon(shapely.ops.polygonize([shapely.ops.unary_union([line_string])]))
@@ -253,103 +370,94 @@ def _paths_to_stencil_shape(to_cam_matrix, is_orthographic, paths):
     return shape if shape.is_valid and not shape.is_empty else None
 
 
-def _stencil_shape_to_stencil_mesh(from_cam_matrix, is_orthographic, far_dist, buffer_ratio, shape, context):
+def _grow_stencil_shape(shape, buffer_ratio):
+    """Grows a 2D stencil shape slightly. This helps generate better geometry in some cases, by filling in holes that
+    may have been created by floating point error.
+    Returns the grown shape.
+    shape - The shape to grow, as returned by _carver_to_stencil_shape.
+    buffer_ratio - Amount by which to grow the stencil shape, as a fraction of the shape's width or height (whichever
+        is larger).
+    """
+    min_x, min_y, max_x, max_y = shape.bounds
+    approx_shape_size = max(max_x - min_x, max_y - min_y)
+    return shape.buffer(approx_shape_size * buffer_ratio)
+
+
+def _stencil_shape_to_stencil_mesh(from_cam_matrix, is_orthographic, far_dist, shape, context):
     """Creates a stencil mesh object by projecting the specified 2D shape into 3D space through the viewport camera.
-    Warning: This function may change the selection state of objects in the scene.
     Returns a newly created stencil mesh object that has been linked to the scene. Returns None if shape is None or
     cannot be converted to a stencil mesh.
-    from_cam_matrix - Transformation matrix from the viewport camera's 3D space to world space.
+    from_cam_matrix - Transformation matrix from the viewport camera's 3D space to world space, as a 4x4 NumPy array.
     is_orthographic - Boolean indicating whether the viewport camera is orthographic (true) or perspective (false).
     far_dist - Minimum distance from the camera that the 'far' part of the stencil mesh needs to have.
-    buffer_ratio - Amount by which to grow the stencil shape to avoid bad geometry, as a fraction of the shape's width
-        or height (whichever is larger).
-    shape - The shape to convert, as returned by _carver_to_stencil_shape.
+    shape - The shape to convert, as returned by _grow_stencil_shape.
     context - The Blender context.
     """
     if shape is None:
         return None
 
-    # Grow the stencil shape slightly. This helps generate better geometry in some cases, by filling in holes that may
-    # have been created by floating point error.
-    min_x, min_y, max_x, max_y = shape.bounds
-    approx_shape_size = max(max_x - min_x, max_y - min_y)
-    buffered_shape = shape.buffer(approx_shape_size * buffer_ratio)
-
     # Triangulate the stencil shape so we won't have to make Blender mesh faces with holes in them.
-    triangulated_shape = _triangulate_stencil_shape(buffered_shape)
+    triangulated_shape = _triangulate_stencil_shape(shape)
     if triangulated_shape is None:
         return None
-    vertices_2d = triangulated_shape['vertices'].tolist()
-    triangles_2d = triangulated_shape['triangles'].tolist()
+    vertices_2d = triangulated_shape['vertices']
+    triangles_2d = triangulated_shape['triangles']
     num_vertices_2d = len(vertices_2d)
 
-    # Build the 3D vertices.
-    vertices = [_vp_plane_project_pt_inv(from_cam_matrix, is_orthographic, far_dist, pt, False) for pt in vertices_2d]
+    # Build the 3D vertices. In perspective mode, all the near-camera vertices collapse to the camera position, so only
+    # one of them is needed.
+    near_vertices_2d = vertices_2d if is_orthographic else [(0, 0)]
+    vertices = np.concatenate((
+        _vp_plane_project_pts_inv(from_cam_matrix, is_orthographic, far_dist, vertices_2d, False),
+        _vp_plane_project_pts_inv(from_cam_matrix, is_orthographic, far_dist, near_vertices_2d, True)))
+
+    # Build the faces for the near-camera and far-from-camera parts of the mesh, and the faces that bridge them along
+    # the shape's boundary. Each group of faces is built as a single array, since all faces in a group have the same
+    # number of vertices.
+    boundary_edges = _find_boundary_edges(triangles_2d)
     if is_orthographic:
-        vertices += [_vp_plane_project_pt_inv(from_cam_matrix, is_orthographic, far_dist, pt, True)
-                     for pt in vertices_2d]
+        face_groups = (triangles_2d, triangles_2d + num_vertices_2d,
+                       np.column_stack((boundary_edges, boundary_edges[:, ::-1] + num_vertices_2d)))
     else:
-        vertices.append(_vp_plane_project_pt_inv(from_cam_matrix, is_orthographic, far_dist, (0, 0), True))
+        face_groups = (triangles_2d, np.column_stack((boundary_edges, np.full(len(boundary_edges), num_vertices_2d))))
 
-    # Build the faces for the near-camera and far-from-camera parts of the mesh.
-    faces = triangles_2d.copy()
-    if is_orthographic:
-        faces += [(tri[0] + num_vertices_2d, tri[1] + num_vertices_2d, tri[2] + num_vertices_2d)
-                  for tri in triangles_2d]
-
-    # Find the 2D edges, and count the number of (triangular) faces attached to each edge. Edges with only one face are
-    # boundary edges of the shape and will require bridge faces in the 3D mesh.
-    edge_counts = collections.Counter()
-    for tri in triangles_2d:
-        edge_0 = frozenset((tri[0], tri[1]))
-        edge_1 = frozenset((tri[1], tri[2]))
-        edge_2 = frozenset((tri[2], tri[0]))
-        edge_counts.update((edge_0, edge_1, edge_2))
-
-    # Build the 3D faces that bridge the near-camera and far-from-camera parts of the mesh.
-    for edge_set, count in edge_counts.items():
-        edge = tuple(edge_set)
-        if count == 1:
-            if is_orthographic:
-                faces.append((edge[0], edge[1], edge[1] + num_vertices_2d, edge[0] + num_vertices_2d))
-            else:
-                faces.append((edge[0], edge[1], num_vertices_2d))
-
-    # Build the edges.
-    def edges_from_face(face_verts):
-        output = []
-        for idx in range(len(face_verts)):
-            output.append((face_verts[idx], face_verts[(idx + 1) % len(face_verts)]))
-        return output
-    edges = []
-    for face in faces:
-        edges.extend(edges_from_face(face))
-
-    # Build a Blender mesh object from the computed geometry data, freeing the Python data as early as possible.
+    # Flatten the faces into the loop layout used by Blender meshes.
+    loop_vert_idxs = np.concatenate([face_group.reshape(-1) for face_group in face_groups])
+    face_loop_totals = np.concatenate([np.full(len(face_group), face_group.shape[1]) for face_group in face_groups])
+    face_loop_starts = np.cumsum(face_loop_totals) - face_loop_totals
+    del face_groups
+
+    # Build a Blender mesh object from the computed geometry data. Blender computes the edges from the faces.
 
     mesh = bpy.data.meshes.new('viewCarveTemp_stencilMesh')
     mesh_obj = None
     try:
-        mesh.from_pydata(vertices, edges, faces)
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set('co', vertices.astype(np.float32).reshape(-1))
+        mesh.loops.add(len(loop_vert_idxs))
+        mesh.loops.foreach_set('vertex_index', loop_vert_idxs.astype(np.int32))
+        mesh.polygons.add(len(face_loop_totals))
+        mesh.polygons.foreach_set('loop_start', face_loop_starts.astype(np.int32))
+        mesh.polygons.foreach_set('loop_total', face_loop_totals.astype(np.int32))
         del vertices
-        del edges
-        del faces
-        mesh.update()
-        if not mesh.validate():
+        del loop_vert_idxs
+        mesh.update(calc_edges=True)
+        if _VALIDATE_MESHES and mesh.validate():
             raise ValueError('Somehow created invalid mesh; cannot continue')
 
+        # Set consistent normals for the mesh.
+        stencil_bmesh = bmesh.new()
+        try:
+            stencil_bmesh.from_mesh(mesh)
+            bmesh.ops.recalc_face_normals(stencil_bmesh, faces=stencil_bmesh.faces)
+            stencil_bmesh.to_mesh(mesh)
+        finally:
+            stencil_bmesh.free()
+        mesh.update()
+
         mesh_obj = bpy.data.objects.new('viewCarveTemp_stencilMeshObj', mesh)
         context.scene.collection.objects.link(mesh_obj)
 
-        # Set consistent normals for the mesh.
-        bpy.ops.object.select_all(action='DESELECT')
-        mesh_obj.select_set(True)
-        context.view_layer.objects.active = mesh_obj
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='SELECT')
-        bpy.ops.mesh.normals_make_consistent()
-        bpy.ops.object.mode_set(mode='OBJECT')
-
         return mesh_obj
 
     except Exception as e:
@@ -371,43 +479,73 @@ def _triangulate_stencil_shape(shape):
     if shape is None:
         return None
 
-    # Convert the stencil shape to the format required by the triangle library.
-
-    vertices = ordered_set.OrderedSet()
-    segments = ordered_set.OrderedSet()
-    hole_pts = ordered_set.OrderedSet()
-
-    def add_segments(coords_list):
-        for idx in range(len(coords_list) - 1):
-            segments.add((vertices.index(coords_list[idx]), vertices.index(coords_list[idx + 1])))
-
-    if not isinstance(shape, (GeometryCollection, MultiPolygon)):
-        shape = GeometryCollection([shape])
-    for geom in shape:
-        if isinstance(geom, Polygon):
-            # Add vertices.
-            for point in geom.exterior.coords:
-                vertices.add(point)
-            for interior in geom.interiors:
-                for point in interior.coords:
-                    vertices.add(point)
-
-            # Add segments.
-            add_segments(geom.exterior.coords)
-            for interior in geom.interiors:
-                add_segments(interior.coords)
-
-            # Add holes.
-            for interior in geom.interiors:
-                interior_polygon = Polygon(interior.coords)
-                hole_pt = interior_polygon.representative_point()
-                hole_pts.add((hole_pt.x, hole_pt.y))
-
-    if len(vertices) <= 0 or len(segments) <= 0:
+    # Convert the stencil shape to the format required by the triangle library. Dicts are used as insertion-ordered
+    # sets, with the vertices dict mapping each vertex to its index. Vertices are keyed by their coordinates quantized
+    # to a grid much finer than the shape, so that ring points which differ only by floating point error become a single
+    # vertex. Segments whose endpoints merge are dropped.
+
+    vertices = {}
+    vertex_coords = []
+    segments = {}
+    hole_pts = {}
+
+    vert_key_scale = _VERTEX_KEY_RESOLUTION / (max(map(abs, shape.bounds), default=0.0) or 1.0)
+
+    def add_vertex(point, key):
+        vert_idx = vertices.get(key)
+        if vert_idx is None:
+            vert_idx = vertices[key] = len(vertex_coords)
+            vertex_coords.append(point)
+        return vert_idx
+
+    if _SHAPELY_HAS_ARRAY_API:
+        # Pull out the coordinates of every ring of every polygon, with each polygon's exterior ring
+        # followed by its interior rings. Segments join consecutive coordinates within the same ring.
+        parts = shapely.get_parts(shape)
+        polygons = parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON]
+        rings, ring_polygon_idxs = shapely.get_rings(polygons, return_index=True)
+        coords, coord_ring_idxs = shapely.get_coordinates(rings, return_index=True)
+        coord_keys = np.round(coords * vert_key_scale).astype(np.int64)
+        vert_idxs = np.array([add_vertex(point, key)
+                              for point, key in zip(coords.tolist(), map(tuple, coord_keys.tolist()))], dtype=np.int64)
+        segment_mask = (coord_ring_idxs[:-1] == coord_ring_idxs[1:]) & (vert_idxs[:-1] != vert_idxs[1:])
+        segments.update(dict.fromkeys(map(tuple, np.column_stack((vert_idxs[:-1][segment_mask],
+                                                                  vert_idxs[1:][segment_mask])).tolist())))
+
+        # Add holes, using a point inside each interior ring to identify the hole. Every ring after the first one of
+        # its polygon is an interior ring.
+        interior_rings = rings[1:][ring_polygon_idxs[1:] == ring_polygon_idxs[:-1]]
+        if len(interior_rings) > 0:
+            hole_pts_arr = shapely.get_coordinates(shapely.point_on_surface(shapely.polygons(interior_rings)))
+            hole_pts.update(dict.fromkeys(map(tuple, hole_pts_arr.tolist())))
+
+    else:
+        def add_vertices_and_segments(coords_list):
+            vert_idxs = [add_vertex(point, (round(point[0] * vert_key_scale), round(point[1] * vert_key_scale)))
+                         for point in coords_list]
+            for idx in range(len(vert_idxs) - 1):
+                if vert_idxs[idx] != vert_idxs[idx + 1]:
+                    segments[(vert_idxs[idx], vert_idxs[idx + 1])] = None
+
+        if not isinstance(shape, (GeometryCollection, MultiPolygon)):
+            shape = GeometryCollection([shape])
+        for geom in shape.geoms:
+            if isinstance(geom, Polygon):
+                # Add vertices and segments.
+                add_vertices_and_segments(geom.exterior.coords)
+                for interior in geom.interiors:
+                    add_vertices_and_segments(interior.coords)
+
+                # Add holes, using a point inside each interior ring to identify the hole.
+                for interior in geom.interiors:
+                    hole_pt = Polygon(interior.coords).representative_point()
+                    hole_pts[(hole_pt.x, hole_pt.y)] = None
+
+    if len(vertex_coords) <= 0 or len(segments) <= 0:
         return None
 
     shape_for_triangle_lib = {
-        'vertices': [list(vert) for vert in vertices],
+        'vertices': [list(vert) for vert in vertex_coords],
         'segments': [list(seg) for seg in segments]
     }
     if len(hole_pts) > 0:
@@ -417,43 +555,65 @@ def _triangulate_stencil_shape(shape):
     return triangle.triangulate(shape_for_triangle_lib, 'p')
 
 
-def _vp_plane_project_pt(to_cam_matrix, is_orthographic, pt):
-    """Projects a single 3D point into the viewport camera's 2D plane.
-    Returns the 2D point as a 2-tuple of numbers.
-    Raises ValueError if the point is behind the camera.
-    to_cam_matrix - Transformation matrix from the input point's 3D space to the 3D space relative to the camera.
+def _find_boundary_edges(triangles):
+    """Finds the boundary edges of a triangulated 2D shape, i.e. the edges that belong to only one triangle.
+    Returns the boundary edges as an (N, 2) NumPy array of vertex indices.
+    triangles - The triangles making up the shape, as an (M, 3) array of vertex indices.
+    """
+    # Gather the three edges of every triangle, then count how many triangles share each edge by finding the unique
+    # edges in a vertex-order-independent form.
+    triangles = np.asarray(triangles)
+    edges = np.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]))
+    _, unique_edge_idxs, edge_counts = np.unique(np.sort(edges, axis=1), axis=0, return_inverse=True,
+                                                 return_counts=True)
+    return edges[edge_counts[unique_edge_idxs.reshape(-1)] == 1]
+
+
+def _vp_plane_project_pts(to_cam_matrix, is_orthographic, pts):
+    """Projects 3D points into the viewport camera's 2D plane.
+    The points are transformed together as a NumPy array, rather than one mathutils.Vector at a time.
+    Returns the 2D points as an (N, 2) NumPy array.
+    Raises ValueError if any of the points is behind the camera.
+    to_cam_matrix - Transformation matrix from the input points' 3D space to the 3D space relative to the camera, as a
+        mathutils.Matrix or a 4x4 NumPy array.
     is_orthographic - Boolean indicating whether the viewport camera is orthographic (true) or perspective (false).
-    pt - 3D input point to project, as a 3-tuple of numbers.
+    pts - 3D input points to project, as a sequence of 3-tuples of numbers.
     """
-    projected_pt = to_cam_matrix @ mathutils.Vector((pt[0], pt[1], pt[2], 1))
+    to_cam_matrix = np.asarray(to_cam_matrix, dtype=np.float64)
+    projected_pts = np.asarray(pts, dtype=np.float64).reshape(-1, 3) @ to_cam_matrix[:3, :3].T + to_cam_matrix[:3, 3]
     if is_orthographic:
-        return projected_pt[0], projected_pt[1]
+        return projected_pts[:, :2]
     else:
-        if projected_pt[2] >= 0:
+        if np.any(projected_pts[:, 2] >= 0):
             raise ValueError('Carver object is behind the viewport camera')
-        return projected_pt[0] / -projected_pt[2], projected_pt[1] / -projected_pt[2]
+        return projected_pts[:, :2] / -projected_pts[:, 2:3]
 
 
-def _vp_plane_project_pt_inv(from_cam_matrix, is_orthographic, far_dist, pt, close_to_cam):
-    """Projects a point in the viewport camera's 2D plane into 3D space, using a depth that is either 'close to' or 'far
+def _vp_plane_project_pts_inv(from_cam_matrix, is_orthographic, far_dist, pts, close_to_cam):
+    """Projects points in the viewport camera's 2D plane into 3D space, using a depth that is either 'close to' or 'far
     from' the viewport camera.
-    Returns the 3D point as a 3-tuple of numbers.
-    from_cam_matrix - Transformation matrix from the viewport camera's 3D space to the output point's 3D space. If the
+    Returns the 3D points as an (N, 3) NumPy array.
+    from_cam_matrix - Transformation matrix from the viewport camera's 3D space to the output points' 3D space. If the
         desired output space is world space, this matrix should be the inverse of the viewport camera's view matrix.
+        May be a mathutils.Matrix or a 4x4 NumPy array.
     is_orthographic - Boolean indicating whether the viewport camera is orthographic (true) or perspective (false).
-    far_dist - Lower bound on the distance of the result from the camera if close_to_cam is false. The resulting point
-        will be in a plane perpendicular to the camera's facing direction, with the plane's distance from the camera
-        equal to this distance.
-    pt - 2D input point in the viewport plane, as a 2-tuple of numbers.
-    close_to_cam - Boolean indicating whether the output point should be close to the viewport camera (true) or far from
-        the viewport camera (false).
+    far_dist - Lower bound on the distance of the results from the camera if close_to_cam is false. The resulting
+        points will be in a plane perpendicular to the camera's facing direction, with the plane's distance from the
+        camera equal to this distance.
+    pts - 2D input points in the viewport plane, as a sequence of 2-tuples of numbers.
+    close_to_cam - Boolean indicating whether the output points should be close to the viewport camera (true) or far
+        from the viewport camera (false).
     """
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    view_space_output = np.empty((len(pts), 3))
     if is_orthographic:
-        view_space_output = mathutils.Vector((pt[0], pt[1], far_dist if close_to_cam else -far_dist, 1))
+        view_space_output[:, :2] = pts
+        view_space_output[:, 2] = far_dist if close_to_cam else -far_dist
     elif close_to_cam:
-        view_space_output = mathutils.Vector((0, 0, 0, 1))
+        view_space_output[:] = 0
     else:
-        view_space_output = mathutils.Vector((pt[0] * far_dist, pt[1] * far_dist, -far_dist, 1))
+        view_space_output[:, :2] = pts * far_dist
+        view_space_output[:, 2] = -far_dist
 
-    output_vec = from_cam_matrix @ view_space_output
-    return output_vec[0], output_vec[1], output_vec[2]
+    from_cam_matrix = np.asarray(from_cam_matrix, dtype=np.float64)
+    return view_space_output @ from_cam_matrix[:3, :3].T + from_cam_matrix[:3, 3]
@@ -5,7 +5,7 @@ import traceback
 import math
 
 import bpy
-import mathutils
+import numpy as np
 
 from . import util_mesh
 from . import mesh_project
@@ -14,7 +14,57 @@ from . import mesh_project
 _PROJECT_DIST_PADDING = 1
 
 # Types of carver objects that are supported.
-_SUPPORTED_CARVER_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'GPENCIL'}
+_SUPPORTED_CARVER_TYPES = frozenset(('MESH', 'CURVE', 'SURFACE', 'FONT', 'GPENCIL'))
+
+
+def _max_dist_to_bound_box(obj, pt):
+    """Computes the largest distance from a point to any corner of an object's bounding box.
+    Returns the distance as a number.
+    obj - The Blender object whose bounding box should be used.
+    pt - The point to measure from, in world space.
+    """
+    # Transform each corner of the bounding box to world space, using the rows of the object's matrix.
+    (m00, m01, m02, m03), (m10, m11, m12, m13), (m20, m21, m22, m23) = \
+        (tuple(row) for row in obj.matrix_world[:3])
+    px, py, pz = pt[0], pt[1], pt[2]
+    max_dist_squared = 0.0
+    for x, y, z in obj.bound_box:
+        dx = m00 * x + m01 * y + m02 * z + m03 - px
+        dy = m10 * x + m11 * y + m12 * z + m13 - py
+        dz = m20 * x + m21 * y + m22 * z + m23 - pz
+        dist_squared = dx * dx + dy * dy + dz * dz
+        if dist_squared > max_dist_squared:
+            max_dist_squared = dist_squared
+    return math.sqrt(max_dist_squared)
+
+
+def _world_bound_box(mesh_obj):
+    """Computes the axis-aligned bounding box of a mesh object's vertices in world space.
+    The box is computed from the mesh data rather than from the object's bound_box, since bound_box may not reflect
+    Boolean modifiers that have just been applied until the dependency graph is next evaluated.
+    Returns the box as a pair of NumPy arrays giving the minimum and maximum corners, or None if the mesh has no
+    vertices.
+    mesh_obj - The Blender mesh object whose bounding box should be computed.
+    """
+    mesh_verts = mesh_obj.data.vertices
+    if len(mesh_verts) <= 0:
+        return None
+    vert_coords = np.empty(len(mesh_verts) * 3, dtype=np.float32)
+    mesh_verts.foreach_get('co', vert_coords)
+    to_world_matrix = np.array(mesh_obj.matrix_world, dtype=np.float64)
+    world_coords = vert_coords.reshape(-1, 3) @ to_world_matrix[:3, :3].T + to_world_matrix[:3, 3]
+    return world_coords.min(axis=0), world_coords.max(axis=0)
+
+
+def _bound_boxes_overlap(bound_box_a, bound_box_b, tolerance):
+    """Checks whether two axis-aligned bounding boxes, as returned by _world_bound_box, overlap.
+    Returns true if the boxes overlap or are within the tolerance of each other, or false otherwise.
+    bound_box_a - The first bounding box.
+    bound_box_b - The second bounding box.
+    tolerance - Distance by which the boxes may be separated while still being considered overlapping.
+    """
+    return bool(np.all(bound_box_a[0] <= bound_box_b[1] + tolerance)
+                and np.all(bound_box_b[0] <= bound_box_a[1] + tolerance))
 
 
 class VIEW_CARVE_OT_stencil(bpy.types.Operator):
@@ -23,9 +73,11 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
     Properties:
     prop_pieces_to_keep - Determines whether to keep only the pieces obtained by Boolean subtraction, only the pieces
         obtained by Boolean intersection, or both. Default: Keep all pieces.
-    prop_union_carves - If true, the operator will apply all found carvers as a single cut. This option only matters
-        when prop_subtract_only is false. In that case, setting prop_union_carves to true results in a maximum of one
-        new object, while setting it to false can result in more than one new object. Default: False
+    prop_union_carves - If true, the operator will apply all found carvers as a single cut, with the stencil grown based
+        on the size of the combined carver shape. When keeping all pieces, setting prop_union_carves to true results
+        in a maximum of one new object, while setting it to false can result in more than one new object. When keeping
+        only the difference, a single cut is made either way, but each carver's shape is grown by its own size unless
+        prop_union_carves is true. Default: False
     prop_delete_carvers - If true, the objects used for carving will be deleted. Default: False
     prop_overlap_threshold - Overlap threshold to use in Boolean operations invoked by this operator.
     """
@@ -55,31 +107,29 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
 
     @classmethod
     def poll(cls, context):
+        if context is None or getattr(context, 'mode', None) != 'OBJECT' \
+                or getattr(context, 'region_data', None) is None:
+            return False
+        scene_collection = getattr(getattr(context, 'scene', None), 'collection', None)
+        if getattr(scene_collection, 'objects', None) is None:
+            return False
+        active_obj = getattr(getattr(getattr(context, 'view_layer', None), 'objects', None), 'active', None)
+        selected_objs = getattr(context, 'selected_objects', None)
+
         # Make sure we are in Object Mode with at least two selected objects.
-        # TODO: It should be len(list(context.selected_objects)) < 2 instead of len(list(context.selected_objects)) < 1,
-        # but currently that doesn't work well due to what appears to be a bug in Blender.
-        if context is None \
-                or not hasattr(context, 'region_data') or context.region_data is None \
-                or not hasattr(context, 'scene') or context.scene is None \
-                or not hasattr(context.scene, 'collection') or context.scene.collection is None \
-                or not hasattr(context.scene.collection, 'objects') or context.scene.collection.objects is None \
-                or not hasattr(context, 'view_layer') or context.view_layer is None \
-                or not hasattr(context.view_layer, 'objects') or context.view_layer.objects is None \
-                or not hasattr(context.view_layer.objects, 'active') or context.view_layer.objects.active is None \
-                or not hasattr(context, 'selected_objects') or context.selected_objects is None \
-                or len(list(context.selected_objects)) < 1 \
-                or not hasattr(context, 'mode') or context.mode != 'OBJECT':
+        # TODO: It should be len(selected_objs) < 2 instead of len(selected_objs) < 1, but currently that doesn't work
+        # well due to what appears to be a bug in Blender.
+        if active_obj is None or selected_objs is None or len(selected_objs) < 1:
             return False
 
         # Make sure the carve target (active object) is a mesh object.
-        if context.view_layer.objects.active.type != 'MESH':
+        if active_obj.type != 'MESH':
             return False
 
         # Make sure the carver objects (non-active selected objects) are of supported types.
-        for selected_obj in list(context.selected_objects):
-            if selected_obj is not context.view_layer.objects.active:
-                if selected_obj.type not in _SUPPORTED_CARVER_TYPES:
-                    return False
+        for selected_obj in selected_objs:
+            if selected_obj is not active_obj and selected_obj.type not in _SUPPORTED_CARVER_TYPES:
+                return False
 
         return True
 
@@ -89,48 +139,65 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
         try:
             # Find the carver objects.
             orig_target = context.view_layer.objects.active
-            carver_objs = [obj for obj in list(context.selected_objects) if obj is not orig_target]
+            carver_objs = [obj for obj in context.selected_objects if obj is not orig_target]
 
-            # Determine where the viewport camera is in world space.
-            view_matrix_inv = context.region_data.view_matrix.inverted()
-            cam_pt = (view_matrix_inv @ mathutils.Vector((0, 0, 0, 1))).to_3d()
+            # Determine where the viewport camera is in world space, from the translation part of the inverse view
+            # matrix.
+            cam_pt = context.region_data.view_matrix.inverted().translation
 
             # Determine projection distance required to make the stencil meshes cut through the active object.
-            target_to_world = orig_target.matrix_world
-            bb_pts = [(target_to_world @ mathutils.Vector((bb_pt[0], bb_pt[1], bb_pt[2], 1))).to_3d()
-                      for bb_pt in orig_target.bound_box]
-            project_dist = math.sqrt(max([(bb_pt - cam_pt).length_squared for bb_pt in bb_pts])) + _PROJECT_DIST_PADDING
+            project_dist = _max_dist_to_bound_box(orig_target, cam_pt) + _PROJECT_DIST_PADDING
+
+            # Get the operator properties used by the carve loop.
+            pieces_to_keep = self.prop_pieces_to_keep
+            overlap_threshold = self.prop_overlap_threshold
 
             # Create stencil mesh objects from the carver objects. (Only one stencil mesh will be created if we are in
-            # Union Carves mode.)
+            # Union Carves mode.) When only the difference is kept, the separate stencils are merged into one, since
+            # subtracting them one after another cuts the same region as subtracting the merged stencil.
             stencil_mesh_objs = mesh_project.carvers_to_stencil_meshes(context.region_data.view_matrix,
                                                                        not context.region_data.is_perspective,
                                                                        project_dist, self.prop_buffer_ratio,
                                                                        carver_objs, self.prop_delete_carvers,
-                                                                       self.prop_union_carves, context)
+                                                                       self.prop_union_carves, context,
+                                                                       merge_stencils=pieces_to_keep == 'DIFFERENCE')
 
-            # Apply each stencil mesh.
+            # Apply each stencil mesh to every target that existed before that stencil. Unless only the intersection is
+            # kept, a stencil cannot change a target it doesn't touch (the intersection piece would just be empty and
+            # removed below), so targets whose bounding boxes don't overlap the stencil's are skipped without running
+            # any Boolean operations.
             targets = [orig_target]
+            cull_by_bound_box = pieces_to_keep != 'INTERSECTION'
             for stencil_mesh_obj in stencil_mesh_objs:
-                new_targets = []
-                for target in targets:
-                    new_target = self._separate_obj(context, target, stencil_mesh_obj)
+                stencil_bound_box = _world_bound_box(stencil_mesh_obj) if cull_by_bound_box else None
+                for target_idx in range(len(targets)):
+                    if stencil_bound_box is not None:
+                        target_bound_box = _world_bound_box(targets[target_idx])
+                        if target_bound_box is None \
+                                or not _bound_boxes_overlap(stencil_bound_box, target_bound_box, overlap_threshold):
+                            continue
+                    new_target = self._separate_obj(context, targets[target_idx], stencil_mesh_obj, pieces_to_keep,
+                                                    overlap_threshold)
                     if new_target is not None:
-                        new_targets.append(new_target)
+                        targets.append(new_target)
                         new_objs.append(new_target)
-                targets += new_targets
 
             # Remove any objects that have been made empty by the boolean operations.
+            empty_targets = []
+            kept_new_objs = []
             for target in targets:
-                if len(list(target.data.vertices)) == 0:
-                    if target is orig_target:
-                        orig_target = None
-                    else:
-                        new_objs.remove(target)
-                    bpy.data.objects.remove(target)
+                if len(target.data.vertices) == 0:
+                    empty_targets.append(target)
+                elif target is not orig_target:
+                    kept_new_objs.append(target)
+            new_objs = kept_new_objs
+            if any(target is orig_target for target in empty_targets):
+                orig_target = None
+            bpy.data.batch_remove(ids=empty_targets)
 
             # Set the final selection to something that makes sense for the operation.
-            bpy.ops.object.select_all(action='DESELECT')
+            for selected_obj in context.selected_objects:
+                selected_obj.select_set(False)
             for new_obj in new_objs:
                 new_obj.select_set(True)
             if orig_target is not None:
@@ -141,8 +208,7 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
 
         except Exception as e:
             # In case of error, try to clean up any partial results owned by Blender.
-            for new_obj in new_objs:
-                bpy.data.objects.remove(new_obj)
+            bpy.data.batch_remove(ids=new_objs)
 
             self.report({'ERROR'}, str(e))
             traceback.print_exc()
@@ -151,32 +217,32 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
 
         finally:
             # Clean up intermediate objects that were created, whether there was an error or not.
-            for stencil_mesh_obj in stencil_mesh_objs:
-                bpy.data.objects.remove(stencil_mesh_obj)
+            bpy.data.batch_remove(ids=stencil_mesh_objs)
 
-    def _separate_obj(self, context, target, stencil_mesh_obj):
+    @staticmethod
+    def _separate_obj(context, target, stencil_mesh_obj, pieces_to_keep, overlap_threshold):
         """Separates a mesh object using the specified stencil mesh.
         Modifies the original target mesh using the stencil.
         Returns the new mesh object obtained by cutting off a piece of the target, or None if no object was generated.
         context - The Blender context.
         target - The mesh object to carve.
         stencil_mesh_obj - The mesh object to use for boolean operations on the target.
+        pieces_to_keep - Value of the operator's prop_pieces_to_keep property.
+        overlap_threshold - Overlap threshold to use in Boolean operations.
         """
         # If we are keeping all pieces, we need to copy the target mesh and perform both intersection and difference.
-        if self.prop_pieces_to_keep == 'ALL':
+        if pieces_to_keep == 'ALL':
             new_target = None
             try:
-                # Copy the target.
-                bpy.ops.object.select_all(action='DESELECT')
-                target.select_set(True)
-                context.view_layer.objects.active = target
-                bpy.ops.object.duplicate(linked=False)
-                new_target = context.view_layer.objects.active
+                # Copy the target, linking the copy into the same collections.
+                new_target = target.copy()
+                new_target.data = target.data.copy()
+                for collection in target.users_collection:
+                    collection.objects.link(new_target)
 
                 # Perform difference on the old copy and intersection on the new copy.
-                util_mesh.apply_boolean_op(context, target, stencil_mesh_obj, 'DIFFERENCE', self.prop_overlap_threshold)
-                util_mesh.apply_boolean_op(context, new_target, stencil_mesh_obj, 'INTERSECT',
-                                           self.prop_overlap_threshold)
+                util_mesh.apply_boolean_op(context, target, stencil_mesh_obj, 'DIFFERENCE', overlap_threshold)
+                util_mesh.apply_boolean_op(context, new_target, stencil_mesh_obj, 'INTERSECT', overlap_threshold)
 
                 return new_target
 
@@ -191,6 +257,6 @@ class VIEW_CARVE_OT_stencil(bpy.types.Operator):
         # copy.
         else:
             util_mesh.apply_boolean_op(context, target, stencil_mesh_obj,
-                                       'DIFFERENCE' if self.prop_pieces_to_keep == 'DIFFERENCE' else 'INTERSECT',
-                                       self.prop_overlap_threshold)
+                                       'DIFFERENCE' if pieces_to_keep == 'DIFFERENCE' else 'INTERSECT',
+                                       overlap_threshold)
             return None